@@ -1,8 +1,15 @@
 #!/usr/bin/env python
 import argparse
 import json
+import mmap
+import os
 from pathlib import Path
 
+try:
+    import orjson as _json
+except ImportError:
+    _json = json
+
 INVENTORY_KEYS = (
     "inv_pickups_by_name",
     "inv_pickups_by_class",
@@ -13,22 +20,37 @@ INVENTORY_KEYS = (
 
 
 def parse_xlog_line(xlog_path: Path, ttyrec_name: str):
-    with open(xlog_path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            fields = {}
-            for part in line.split("\t"):
-                if "=" not in part:
-                    continue
-                key, value = part.split("=", 1)
-                fields[key] = value
-            if fields.get("ttyrecname") == ttyrec_name:
-                return fields
+    needle = ttyrec_name.encode("utf-8")
+    with open(xlog_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return {}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            pos = mm.find(needle)
+            # Jump between occurrences of the ttyrec name and only slice out
+            # the rows surrounding them, instead of materializing every row.
+            while 0 <= pos < size:
+                start = mm.rfind(b"\n", 0, pos) + 1
+                end = mm.find(b"\n", pos)
+                if end == -1:
+                    end = size
+                fields = _parse_xlog_fields(mm[start:end])
+                if fields.get("ttyrecname") == ttyrec_name:
+                    return fields
+                pos = mm.find(needle, end + 1)
     return {}
 
 
+def _parse_xlog_fields(raw: bytes):
+    line = raw.decode("utf-8").strip()
+    fields = {}
+    for part in line.split("\t"):
+        key, sep, value = part.partition("=")
+        if sep:
+            fields[key] = value
+    return fields
+
+
 def extract_inventory_metadata(fields):
     metadata = {}
     for key in INVENTORY_KEYS:
@@ -36,8 +58,8 @@ def extract_inventory_metadata(fields):
         if not raw:
             continue
         try:
-            metadata[key] = json.loads(raw)
-        except json.JSONDecodeError:
+            metadata[key] = _json.loads(raw)
+        except _json.JSONDecodeError:
             metadata[key] = {"_raw": raw, "_error": "invalid json"}
     return metadata
 
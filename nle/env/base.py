@@ -13,6 +13,11 @@ import weakref
 import gym
 import numpy as np
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from nle import nethack
 from nle.env.inventory import InventoryStatsTracker
 
@@ -581,7 +586,10 @@ class NLE(gym.Env):
         for key, value in metadata.items():
             if not value:
                 continue
-            payload = json.dumps(value, separators=(",", ":"))
+            if orjson is not None:
+                payload = orjson.dumps(value).decode("utf-8")
+            else:
+                payload = json.dumps(value, separators=(",", ":"))
             fields.append(f"{key}={payload}")
         return "\t".join(fields)
 
@@ -1,9 +1,12 @@
 import collections
+import functools
 import re
+import sys
 from dataclasses import dataclass
 from dataclasses import field
 from typing import Dict
 from typing import Optional
+from typing import Tuple
 
 import numpy as np
 
@@ -28,6 +31,9 @@ CATEGORY_NAMES = {
     nethack.VENOM_CLASS: "venom",
 }
 
+# CATEGORY_NAMES as a lookup table covering every possible (uint8) oclass.
+CATEGORY_BY_OCLASS = [CATEGORY_NAMES.get(oclass, "unknown") for oclass in range(256)]
+
 
 TRACKED_COMMANDS = {
     nethack.Command.EAT: "eat",
@@ -60,6 +66,25 @@ TRACKED_COMMANDS = {
 
 UNKNOWN_ACTION_LABEL = "unknown"
 
+# The patterns below are matched against stripped, lowercased text.
+# Inventory letter ("a - ", "b) ") and a bare "- " bullet.
+_LEADING = re.compile(r"(?:[a-z]\s*[-)]\s+)?(?:- )?")
+# Parenthesized annotations such as "(weapon in hand)".
+_PARENS = re.compile(r"\([^)]*\)")
+# Leading article followed by an item count, e.g. "the 2 ".
+_QUANTIFIERS = re.compile(r"(?:(?:the|an|a) )?(?:\d+ )?")
+
+
+# Inventory lines barely change from one step to the next, so most calls are
+# cache hits.
+@functools.lru_cache(maxsize=4096)
+def _normalize_name(text: str) -> str:
+    text = text.strip().lower()
+    text = text[_LEADING.match(text).end() :]
+    # split()/join() collapses whitespace runs and trims both ends.
+    text = " ".join(_PARENS.sub("", text).split())
+    return text[_QUANTIFIERS.match(text).end() :]
+
 
 @dataclass
 class InventorySnapshot:
@@ -71,15 +96,12 @@ class InventorySnapshot:
 @dataclass
 class ItemStats:
     acquired: int = 0
-    actions: collections.Counter = field(default_factory=collections.Counter)
+    actions: Dict[str, int] = field(default_factory=dict)
 
 
 class InventoryStatsTracker:
     """Keeps track of inventory additions/usages within an episode."""
 
-    _PARENS = re.compile(r"\([^)]*\)")
-    _LETTER_PREFIX = re.compile(r"^[a-zA-Z]\s*[-)]\s+")
-
     def __init__(
         self,
         inv_strs_index: Optional[int],
@@ -88,6 +110,11 @@ class InventoryStatsTracker:
         self._inv_strs_index = inv_strs_index
         self._inv_oclasses_index = inv_oclasses_index
         self._current_snapshot: Optional[InventorySnapshot] = None
+        # Raw inventory bytes of the last extracted snapshot. Snapshots are a
+        # pure function of these, so the cache survives episode resets.
+        self._last_inv_bytes: Optional[Tuple[bytes, bytes]] = None
+        self._last_snapshot: Optional[InventorySnapshot] = None
+        self._label_dispatch = self._build_label_dispatch()
         self._reset_stats()
 
     def enabled(self) -> bool:
@@ -105,28 +132,30 @@ class InventoryStatsTracker:
         self._register_initial_inventory(snapshot)
 
     def record_step(self, action_value: int, observation):
-        if not self.enabled():
+        if not self.enabled() or observation is None:
             return
         if self._current_snapshot is None:
             self._current_snapshot = self._extract_snapshot(observation)
             return
 
-        next_snapshot = self._extract_snapshot(observation)
-        if next_snapshot is None:
-            return
-
-        self._register_pickups(self._current_snapshot, next_snapshot)
-
         command_label = TRACKED_COMMANDS.get(action_value)
         if command_label:
             self._pending_action_label = command_label
 
+        next_snapshot = self._extract_snapshot(observation)
+        if next_snapshot is self._current_snapshot:
+            # Same inventory as last step: nothing was acquired or used.
+            return
+
+        # Counter subtraction only keeps positive counts.
+        added = next_snapshot.counts - self._current_snapshot.counts
+        removed = self._current_snapshot.counts - next_snapshot.counts
+        self._register_pickups(added, next_snapshot)
+
         action_label = self._action_to_label(action_value)
         effective_label = self._pending_action_label or action_label
 
-        used = self._register_usage(
-            effective_label, self._current_snapshot, next_snapshot
-        )
+        used = self._register_usage(effective_label, removed, self._current_snapshot)
         if used and self._pending_action_label:
             self._pending_action_label = None
 
@@ -135,10 +164,12 @@ class InventoryStatsTracker:
     def finalize_episode(self) -> Dict[str, Dict]:
         if not self.enabled():
             return {}
+        # The counters only ever hold positive Python ints and _reset_stats
+        # rebinds them, so they are handed out as-is instead of being copied.
         metadata = {
-            "inv_pickups_by_name": self._counter_to_dict(self._pickups_by_name),
-            "inv_pickups_by_class": self._counter_to_dict(self._pickups_by_class),
-            "inv_uses_by_action": self._counter_to_dict(self._uses_by_action),
+            "inv_pickups_by_name": self._pickups_by_name,
+            "inv_pickups_by_class": self._pickups_by_class,
+            "inv_uses_by_action": self._uses_by_action,
             "inv_uses_by_name": self._nested_counter_to_dict(self._uses_by_name),
             "inv_uses_by_class": self._nested_counter_to_dict(self._uses_by_class),
             "inv_by_name": self._stats_to_dict(self._items_by_name),
@@ -149,11 +180,12 @@ class InventoryStatsTracker:
         return metadata if has_data else {}
 
     def _reset_stats(self):
-        self._pickups_by_name = collections.Counter()
-        self._pickups_by_class = collections.Counter()
-        self._uses_by_action = collections.Counter()
-        self._uses_by_name = collections.defaultdict(collections.Counter)
-        self._uses_by_class = collections.defaultdict(collections.Counter)
+        self._pickups_by_name: Dict[str, int] = {}
+        self._pickups_by_class: Dict[str, int] = {}
+        self._uses_by_action: Dict[str, int] = {}
+        # Keyed by (name, action_label) and only nested again on finalize.
+        self._uses_by_name: Dict[Tuple[str, str], int] = {}
+        self._uses_by_class: Dict[Tuple[str, str], int] = {}
         self._items_by_name: Dict[str, ItemStats] = collections.defaultdict(ItemStats)
         self._categories_by_name: Dict[str, ItemStats] = collections.defaultdict(
             ItemStats
@@ -168,38 +200,44 @@ class InventoryStatsTracker:
         inv_strs = observation[self._inv_strs_index]
         inv_oclasses = observation[self._inv_oclasses_index]
 
+        inv_bytes = (inv_strs.tobytes(), inv_oclasses.tobytes())
+        if inv_bytes == self._last_inv_bytes:
+            return self._last_snapshot
+
         counts = collections.Counter()
         categories = collections.Counter()
         name_to_category: Dict[str, str] = {}
 
-        for raw_line, oclass in zip(inv_strs, inv_oclasses):
-            if int(oclass) == int(nethack.MAXOCLASSES):
-                continue
-            if not np.any(raw_line):
-                continue
+        occupied = inv_strs.any(axis=1) & (inv_oclasses != nethack.MAXOCLASSES)
+        # View each row as one fixed-width bytes item so that only the occupied
+        # rows get converted to Python objects.
+        rows = np.ascontiguousarray(inv_strs).view("S%d" % inv_strs.shape[1])
+        raw_lines = rows.reshape(-1)[occupied].tolist()
+        for raw_line, oclass in zip(raw_lines, inv_oclasses[occupied].tolist()):
             decoded = self._decode_line(raw_line)
             if not decoded:
                 continue
-            normalized = self._normalize_name(decoded)
+            normalized = _normalize_name(decoded)
             if not normalized:
                 continue
             counts[normalized] += 1
-            category_name = CATEGORY_NAMES.get(int(oclass), "unknown")
+            category_name = CATEGORY_BY_OCLASS[oclass]
             categories[category_name] += 1
             name_to_category.setdefault(normalized, category_name)
 
-        return InventorySnapshot(
+        snapshot = InventorySnapshot(
             counts=counts, categories=categories, name_to_category=name_to_category
         )
+        self._last_inv_bytes = inv_bytes
+        self._last_snapshot = snapshot
+        return snapshot
 
     def _register_pickups(
-        self, before: InventorySnapshot, after: InventorySnapshot
+        self, added: collections.Counter, after: InventorySnapshot
     ) -> None:
-        for name, count in after.counts.items():
-            diff = count - before.counts.get(name, 0)
-            if diff > 0:
-                category = after.name_to_category.get(name)
-                self._record_acquisition(name, diff, category)
+        for name, diff in added.items():
+            category = after.name_to_category.get(name)
+            self._record_acquisition(name, diff, category)
 
     def _register_initial_inventory(self, snapshot: InventorySnapshot) -> None:
         for name, count in snapshot.counts.items():
@@ -209,104 +247,98 @@ class InventoryStatsTracker:
     def _record_acquisition(self, name: str, quantity: int, category: Optional[str]):
         if quantity <= 0:
             return
-        self._pickups_by_name[name] += quantity
+        self._pickups_by_name[name] = self._pickups_by_name.get(name, 0) + quantity
         if category:
-            self._pickups_by_class[category] += quantity
+            self._pickups_by_class[category] = (
+                self._pickups_by_class.get(category, 0) + quantity
+            )
             category_stats = self._categories_by_name[category]
             category_stats.acquired += quantity
         stats = self._items_by_name[name]
         stats.acquired += quantity
 
     def _register_usage(
-        self, action_label: str, before: InventorySnapshot, after: InventorySnapshot
+        self,
+        action_label: str,
+        removed: collections.Counter,
+        before: InventorySnapshot,
     ) -> bool:
-        used_any = False
-        for name, prev_count in before.counts.items():
-            current = after.counts.get(name, 0)
-            diff = prev_count - current
-            if diff > 0:
-                self._uses_by_action[action_label] += diff
-                self._uses_by_name[name][action_label] += diff
-                category = before.name_to_category.get(name)
-                if category:
-                    self._uses_by_class[category][action_label] += diff
-                    category_stats = self._categories_by_name[category]
-                    category_stats.actions[action_label] += diff
-                stats = self._items_by_name[name]
-                stats.actions[action_label] += diff
-                used_any = True
-        return used_any
-
-    @classmethod
-    def _decode_line(cls, raw_line) -> str:
-        data = raw_line.tobytes() if hasattr(raw_line, "tobytes") else bytes(raw_line)
-        data = data.split(b"\0", 1)[0].decode("utf-8", "ignore").strip()
-        return data
+        if not removed:
+            return False
+        total = sum(removed.values())
+        self._uses_by_action[action_label] = (
+            self._uses_by_action.get(action_label, 0) + total
+        )
+        for name, diff in removed.items():
+            key = (name, action_label)
+            self._uses_by_name[key] = self._uses_by_name.get(key, 0) + diff
+            category = before.name_to_category.get(name)
+            if category:
+                key = (category, action_label)
+                self._uses_by_class[key] = self._uses_by_class.get(key, 0) + diff
+                category_actions = self._categories_by_name[category].actions
+                category_actions[action_label] = (
+                    category_actions.get(action_label, 0) + diff
+                )
+            item_actions = self._items_by_name[name].actions
+            item_actions[action_label] = item_actions.get(action_label, 0) + diff
+        return True
+
+    @staticmethod
+    def _decode_line(raw_line: bytes) -> str:
+        return raw_line.partition(b"\0")[0].decode("utf-8", "ignore").strip()
 
     def _action_to_label(self, action_value) -> str:
         if action_value in TRACKED_COMMANDS:
             return TRACKED_COMMANDS[action_value]
-        enum_type = type(action_value)
-        name = getattr(action_value, "name", "")
-        compass = getattr(nethack, "CompassDirection", None)
-        if compass is not None and isinstance(action_value, compass):
-            return f"move_{name.lower()}"
-        compass_long = getattr(nethack, "CompassDirectionLonger", None)
-        if compass_long is not None and isinstance(action_value, compass_long):
-            return f"move_{name.lower()}"
-        misc_dir = getattr(nethack, "MiscDirection", None)
-        if misc_dir is not None and isinstance(action_value, misc_dir):
+        labeler = self._label_dispatch.get(type(action_value))
+        if labeler is None:
+            return UNKNOWN_ACTION_LABEL
+        return labeler(action_value.name)
+
+    @staticmethod
+    def _build_label_dispatch():
+        # Labels built here are interned like the literal ones so that
+        # counter lookups keyed by them can compare by identity.
+        def move_label(name):
+            return sys.intern(f"move_{name.lower()}")
+
+        def misc_direction_label(name):
             mapping = {
                 "UP": "move_up",
                 "DOWN": "move_down",
                 "WAIT": "wait",
             }
-            return mapping.get(name, f"move_{name.lower()}")
-        misc_action = getattr(nethack, "MiscAction", None)
-        if misc_action is not None and isinstance(action_value, misc_action):
-            return name.lower()
-        command_enum = getattr(nethack, "Command", None)
-        if command_enum is not None and isinstance(action_value, command_enum):
-            return name.lower()
-        return UNKNOWN_ACTION_LABEL
-
-    def _normalize_name(self, text: str) -> str:
-        text = text.strip()
-        match = self._LETTER_PREFIX.match(text)
-        if match:
-            text = text[match.end() :]
-        if text.startswith("- "):
-            text = text[2:]
-        text = text.strip()
-        text = self._PARENS.sub("", text)
-        text = re.sub(r"\s+", " ", text)
-        for prefix in ("the ", "an ", "a "):
-            if text.lower().startswith(prefix):
-                text = text[len(prefix) :]
-                break
-        text = re.sub(r"^\d+\s+", "", text)
-        return text.lower().strip()
+            return mapping.get(name, move_label(name))
 
-    @staticmethod
-    def _counter_to_dict(counter):
-        return {key: int(val) for key, val in counter.items() if val}
+        def lower_label(name):
+            return sys.intern(name.lower())
+
+        labelers = (
+            ("CompassDirection", move_label),
+            ("CompassDirectionLonger", move_label),
+            ("MiscDirection", misc_direction_label),
+            ("MiscAction", lower_label),
+            ("Command", lower_label),
+        )
+        dispatch = {}
+        for enum_name, labeler in labelers:
+            enum_type = getattr(nethack, enum_name, None)
+            if enum_type is not None:
+                dispatch[enum_type] = labeler
+        return dispatch
 
     @staticmethod
-    def _nested_counter_to_dict(nested):
+    def _nested_counter_to_dict(flat):
         result = {}
-        for key, counter in nested.items():
-            as_dict = {
-                inner_key: int(inner_val) for inner_key, inner_val in counter.items()
-            }
-            if as_dict:
-                result[key] = as_dict
+        for (key, inner_key), val in flat.items():
+            result.setdefault(key, {})[inner_key] = val
         return result
 
-    def _stats_to_dict(self, mapping):
-        result = {}
-        for key, stats in mapping.items():
-            actions = self._counter_to_dict(stats.actions)
-            entry = {"acquired": int(stats.acquired), "actions": actions}
-            if entry["acquired"] or actions:
-                result[key] = entry
-        return result
+    @staticmethod
+    def _stats_to_dict(mapping):
+        return {
+            key: {"acquired": stats.acquired, "actions": stats.actions}
+            for key, stats in mapping.items()
+            if stats.acquired or stats.actions
+        }